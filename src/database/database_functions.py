@@ -7,17 +7,23 @@ This module provides a utility function to establish a connection to a PostgreSQ
 # ======================================================================
 import sys
 import os
+import functools
+import warnings
+from contextlib import contextmanager
 
 file_path = os.getenv('WORK_DIR')
 
-sys.path.append(os.path.abspath(file_path))
+if file_path:
+    sys.path.append(os.path.abspath(file_path))
 
 # Database and SQL
 # ======================================================================
 from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy import create_engine, inspect, Table, MetaData, insert, select
+from sqlalchemy import create_engine, inspect, Table, MetaData, insert, select, text, Boolean, Float, Integer
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
+from psycopg2.extras import execute_values
 
 
 # Data Manipulation
@@ -28,23 +34,56 @@ import pandas as pd
 # ======================================================================
 import logging as log
 
-# JSON
+# JSON and CSV
 # ======================================================================
 import json
+import csv
+import io
 
 log.basicConfig(level=log.INFO)
 
-with open(f'{file_path}/db_settings.json', 'r') as file:
-    credentials = json.load(file)
+MAX_BIND_PARAMS = 65535
+COPY_CHUNKSIZE = 50_000
+EXECUTEMANY_CHUNKSIZE = 10_000
 
-def get_engine(): 
+@functools.lru_cache(maxsize=1)
+def load_credentials() -> dict:
     """
-    Establish a connection to a PostgreSQL database using SQLAlchemy
+    Load the database connection credentials from db_settings.json in WORK_DIR
 
-    Parameters
-    ----------
+    Returns
+    -------
     credentials : dict
         A dictionary containing the database connection credentials
+    """
+    with open(f'{file_path}/db_settings.json', 'r') as file:
+        return json.load(file)
+
+def get_engine(): 
+    """
+    Establish a connection to a PostgreSQL database using SQLAlchemy
+
+    The engine keeps a pool of connections that are checked before use and recycled
+    every 30 minutes, so sessions and queries reuse them instead of reconnecting.
+    It is created once and shared by every caller.
+
+    Returns
+    -------
+    engine : sqlalchemy.engine.base.Engine
+        A SQLAlchemy Engine object representing the established connection.
+        None if the connection could not be established.
+    """
+    try:
+        return _create_engine()
+    except SQLAlchemyError as e:
+        log.error(f'Error: {e}')
+
+@functools.lru_cache(maxsize=1)
+def _create_engine():
+    """
+    Create the SQLAlchemy Engine used by get_engine, creating the database if needed
+
+    Only successful calls are cached, so a failed connection is retried on the next call.
 
     Returns
     -------
@@ -56,6 +95,8 @@ def get_engine():
     SQLAlchemyError: If there is an error establishing the database connection.
 
     """
+    credentials = load_credentials()
+
     dialect = credentials.get('PGDIALECT')
     user = credentials.get('PGUSER')
     passwd = credentials.get('PGPASSWD')
@@ -66,14 +107,52 @@ def get_engine():
     url = f"{dialect}://{user}:{passwd}@{host}:{port}/{db}"
 
 
+    if not database_exists(url):
+        create_database(url)
+        log.info(f'Database  created successfully!')
+    
+    engine_options = {}
+    if make_url(url).get_driver_name() == 'psycopg2':
+        engine_options['executemany_mode'] = 'values_plus_batch'
+
+    engine = create_engine(
+        url,
+        pool_size=10,
+        max_overflow=5,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        **engine_options
+    )
+    log.info(f'Conected successfully to database!')
+    return engine
+
+def init_schema(engine, metadata, drop : bool = False) -> None:
+    """
+    Create every table of a SQLAlchemy MetaData in a PostgreSQL database in one transaction
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.base.Engine
+        A SQLAlchemy Engine object representing the established connection.
+
+    metadata : sqlalchemy.sql.schema.MetaData
+        The MetaData holding the tables to create, e.g. BASE.metadata.
+
+    drop : bool, default False
+        Drop all the tables first, for a full rebuild.
+
+    Returns
+    -------
+    None
+    """
     try:
-        if not database_exists(url):
-            create_database(url)
-            log.info(f'Database  created successfully!')
-        
-        engine = create_engine(url)
-        log.info(f'Conected successfully to database!')
-        return engine
+        with engine.begin() as conn:
+            if drop:
+                metadata.drop_all(conn)
+                log.info("Tables dropped successfully.")
+
+            metadata.create_all(conn, checkfirst=True)
+        log.info("Tables created successfully.")
     except SQLAlchemyError as e:
         log.error(f'Error: {e}')
 
@@ -81,6 +160,8 @@ def create_table(connection , db_model, table_name) -> None:
     """
     Create a table in a PostgreSQL database using SQLAlchemy
 
+    Deprecated, use init_schema to create all the tables of a model's metadata at once.
+
     Parameters
     ----------
     connection : sqlalchemy.engine.base.Engine
@@ -96,6 +177,8 @@ def create_table(connection , db_model, table_name) -> None:
     -------
     None
     """
+    warnings.warn("create_table is deprecated, use init_schema instead.", DeprecationWarning, stacklevel=2)
+
     try:
         if inspect(connection).has_table(table_name):
             db_model.__table__.drop(connection)
@@ -107,10 +190,124 @@ def create_table(connection , db_model, table_name) -> None:
         log.error(f'Error: {e}')
 
 
-def insert_data(df : pd.DataFrame, table_name : str, connection):
+@contextmanager
+def _begin(connection):
+    """
+    Run statements in a transaction on an Engine or Connection, reusing the transaction
+    already open on a Connection instead of beginning a nested one.
+    """
+    if isinstance(connection, Engine):
+        with connection.begin() as conn:
+            yield conn
+    elif connection.in_transaction():
+        yield connection
+    else:
+        with connection.begin():
+            yield connection
+
+def get_model_dtypes(db_model) -> dict:
+    """
+    Map the columns of a database model to the matching pandas dtypes
+
+    Boolean columns map to 'bool', Integer and SmallInteger columns to 'int64' and single
+    precision Float columns to 'float32', so the data sent by insert_data already has the
+    type and width of the table columns, e.g. float-valued ids are sent as integers.
+
+    Parameters
+    ----------
+    db_model : sqlalchemy.orm.decl_api.DeclarativeMeta
+        A SQLAlchemy DeclarativeMeta object representing the database model.
+
+    Returns
+    -------
+    dtypes : dict
+        A dictionary with the column name as key and the pandas dtype as value.
+    """
+    dtypes = {}
+    for column in db_model.__table__.columns:
+        if isinstance(column.type, Boolean):
+            dtypes[column.name] = 'bool'
+        elif isinstance(column.type, Integer):
+            dtypes[column.name] = 'int64'
+        elif isinstance(column.type, Float) and column.type.precision is not None and column.type.precision <= 24:
+            dtypes[column.name] = 'float32'
+
+    return dtypes
+
+
+def psql_copy(table, conn, keys, data_iter) -> None:
+    """
+    Insertion method for pandas to_sql that loads rows with PostgreSQL COPY FROM STDIN
+
+    Parameters
+    ----------
+    table : pandas.io.sql.SQLTable
+        The pandas table being written.
+
+    conn : sqlalchemy.engine.base.Connection
+        A SQLAlchemy Connection object provided by to_sql.
+
+    keys : list
+        A list of column names to be inserted.
+
+    data_iter : iterable
+        An iterable over the rows to be inserted.
+
+    Returns
+    -------
+    None
+    """
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        s_buf = io.StringIO()
+        csv.writer(s_buf).writerows(data_iter)
+        s_buf.seek(0)
+
+        columns = ', '.join(f'"{key}"' for key in keys)
+        table_name = f'"{table.schema or "public"}"."{table.name}"'
+        cur.copy_expert(f'COPY {table_name} ({columns}) FROM STDIN WITH CSV', s_buf)
+
+
+def psql_execute_values(table, conn, keys, data_iter) -> None:
+    """
+    Insertion method for pandas to_sql that loads rows with psycopg2's execute_values
+
+    The rows are sent as multi-row INSERT ... VALUES statements of up to 1000 rows,
+    built by psycopg2 from the row tuples without going through SQLAlchemy.
+
+    Parameters
+    ----------
+    table : pandas.io.sql.SQLTable
+        The pandas table being written.
+
+    conn : sqlalchemy.engine.base.Connection
+        A SQLAlchemy Connection object provided by to_sql.
+
+    keys : list
+        A list of column names to be inserted.
+
+    data_iter : iterable
+        An iterable over the rows to be inserted.
+
+    Returns
+    -------
+    None
+    """
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        columns = ', '.join(f'"{key}"' for key in keys)
+        table_name = f'"{table.schema or "public"}"."{table.name}"'
+        execute_values(cur, f'INSERT INTO {table_name} ({columns}) VALUES %s', data_iter, page_size=1000)
+
+
+def insert_data(df : pd.DataFrame, table_name : str, connection, method=None, chunksize : int = None,
+                if_exists : str = 'append', truncate : bool = False, astype : dict = None):
     """
     Insert data into a table in a PostgreSQL database using to_sql method
 
+    The table creation, the truncate and every chunk run in a single transaction, so a
+    failure leaves the table as it was.
+
     Parameters
     ----------
     df : pandas.DataFrame
@@ -119,23 +316,155 @@ def insert_data(df : pd.DataFrame, table_name : str, connection):
     table_name : str
         A string representing the name of the table to insert the data into.
     
-    connection : sqlalchemy.engine.base.Engine
-        A SQLAlchemy Engine object representing the established connection.
+    connection : sqlalchemy.engine.base.Engine or sqlalchemy.engine.base.Connection
+        A SQLAlchemy Engine object representing the established connection, or a
+        Connection whose open transaction the data is written in.
+
+    method : str or callable, optional
+        The to_sql insertion method. By default psql_copy on PostgreSQL and 'multi',
+        which sends several rows per INSERT statement, on any other dialect.
+        psql_execute_values is a PostgreSQL alternative when COPY is not available.
+        'executemany' reflects the table once and runs the same Core INSERT statement for
+        every chunk, so SQLAlchemy compiles it a single time and reuses it from its cache.
+
+    chunksize : int, optional
+        Number of rows written per batch, each batch being materialized only when it is sent.
+        With 'multi' it defaults to up to 1000 rows, reduced for wide tables so a statement
+        stays under PostgreSQL's 65535 bind parameters limit, with 'executemany' to 10000 rows
+        and with the psql_copy and psql_execute_values methods to 50000 rows.
+
+    if_exists : str, default 'append'
+        Behavior when the table already exists, passed on to to_sql.
+
+    truncate : bool, default False
+        Empty the table before inserting, keeping its schema, indexes and constraints.
+        A missing table is created first, so there is nothing to truncate.
+
+    astype : dict, optional
+        Pandas dtypes to cast the columns to before inserting, e.g. get_model_dtypes(Model).
+        Columns cast to 'bool' or an integer dtype must not contain missing values.
     
     Returns
     -------
     None
     """
     try:
-        df.to_sql(table_name, connection, if_exists='replace', index=False)
+        _insert_data(df, table_name, connection, method, chunksize, if_exists, truncate, astype)
         log.info("Data uploaded")
     except Exception as e:
         log.error(f"Error: {e}")
 
+def _insert_data(df, table_name, connection, method, chunksize, if_exists, truncate, astype) -> None:
+    """
+    Body of insert_data, raising on failure so callers can roll back their own transaction.
+    """
+    if astype is not None:
+        astype = {col: col_type for col, col_type in astype.items() if col in df.columns}
+
+        strict_columns = [col for col, col_type in astype.items()
+                          if pd.api.types.is_bool_dtype(col_type) or pd.api.types.is_integer_dtype(col_type)]
+        null_columns = [col for col in strict_columns if df[col].isna().any()]
+        if null_columns:
+            raise ValueError(f"Missing values in columns cast to bool or integer: {', '.join(null_columns)}")
+
+        df = df.astype(astype)
+
+    if method is None:
+        method = psql_copy if connection.dialect.name == 'postgresql' else 'multi'
+
+    if chunksize is None:
+        if method == 'multi':
+            chunksize = min(1000, MAX_BIND_PARAMS // max(len(df.columns), 1))
+        elif method == 'executemany':
+            chunksize = EXECUTEMANY_CHUNKSIZE
+        else:
+            chunksize = COPY_CHUNKSIZE
+
+    with _begin(connection) as conn:
+        df.head(0).to_sql(table_name, conn, if_exists=if_exists, index=False)
+
+        if truncate:
+            conn.execute(text(f'TRUNCATE TABLE "{table_name}"'))
+            log.info("Table truncated successfully.")
+
+        if method == 'executemany':
+            stmt = insert(Table(table_name, MetaData(), autoload_with=conn))
+            for start in range(0, len(df), chunksize):
+                chunk = df.iloc[start:start + chunksize]
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+                conn.execute(stmt, chunk.to_dict('records'))
+        else:
+            for start in range(0, len(df), chunksize):
+                chunk = df.iloc[start:start + chunksize]
+                chunk.to_sql(table_name, conn, if_exists='append', index=False, method=method)
+
+def load_with_indexes_deferred(df : pd.DataFrame, table_name : str, engine, index_defs : dict,
+                               replica_role : bool = False, method=None, chunksize : int = None,
+                               if_exists : str = 'append', truncate : bool = False, astype : dict = None) -> None:
+    """
+    Insert data into a table in a PostgreSQL database, building its indexes after the load
+
+    The indexes are dropped in the same transaction as the insert and created again
+    once the data is committed, so the bulk load does not update every index for each row.
+    If the load fails the transaction is rolled back, restoring the dropped indexes.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        A pandas DataFrame object representing the data to be inserted.
+
+    table_name : str
+        A string representing the name of the table to insert the data into.
+
+    engine : sqlalchemy.engine.base.Engine
+        A SQLAlchemy Engine object representing the established connection.
+
+    index_defs : dict
+        A dictionary with the index name as key and, as value, either the list of indexed
+        columns for a plain index built with CREATE INDEX CONCURRENTLY, or the full
+        CREATE INDEX statement for UNIQUE, partial or expression indexes.
+
+    replica_role : bool, default False
+        Set session_replication_role to replica during the load, skipping triggers and
+        foreign key checks. Requires superuser privileges.
+
+    method, chunksize, if_exists, truncate, astype
+        Passed on to insert_data.
+
+    Returns
+    -------
+    None
+    """
+    try:
+        with engine.begin() as conn:
+            if replica_role:
+                conn.execute(text("SET LOCAL session_replication_role = replica"))
+
+            for index_name in index_defs:
+                conn.execute(text(f'DROP INDEX IF EXISTS "{index_name}"'))
+            log.info("Indexes dropped successfully.")
+
+            _insert_data(df, table_name, conn, method, chunksize, if_exists, truncate, astype)
+            log.info("Data uploaded")
+
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for index_name, index_def in index_defs.items():
+                if isinstance(index_def, str):
+                    conn.execute(text(index_def))
+                else:
+                    index_columns = ', '.join(f'"{col}"' for col in index_def)
+                    conn.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON "{table_name}" ({index_columns})'))
+        log.info("Indexes created successfully.")
+    except Exception as e:
+        log.error(f'Error: {e}')
+
 def create_session(engine):
     """
     Create a session to interact with a PostgreSQL database using SQLAlchemy
 
+    Objects are not expired on commit, so reading their attributes afterwards
+    does not issue a new SELECT to refresh them.
+
     Parameters
     ----------
     engine : sqlalchemy.engine.base.Engine
@@ -147,13 +476,14 @@ def create_session(engine):
         A SQLAlchemy Session object representing the established connection.
     """
 
-    Session = sessionmaker(bind=engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
     session = Session()
 
     log.info("Session created successfully.")
     return session
 
-def query_table(db_model, connection, session):
+def query_table(db_model, connection, session=None, columns : list = None, where=None,
+                chunksize : int = None, dtype_backend : str = None):
     """
     Query a table in a PostgreSQL database using SQLAlchemy
 
@@ -162,24 +492,83 @@ def query_table(db_model, connection, session):
     db_model : sqlalchemy.orm.decl_api.DeclarativeMeta
         A SQLAlchemy DeclarativeMeta object representing the database model.
 
-    connection : sqlalchemy.engine.base.Engine
-        A SQLAlchemy Engine object representing the established connection.
+    connection : sqlalchemy.engine.base.Engine or sqlalchemy.engine.base.Connection
+        A SQLAlchemy Engine object representing the established connection, or an
+        open Connection to read the rows with.
     
-    session : sqlalchemy.orm.session.Session
-        A SQLAlchemy Session object representing the established connection.
+    session : sqlalchemy.orm.session.Session, optional
+        Not used, the table is read with a single SELECT. Kept for backwards compatibility.
+
+    columns : list, optional
+        The names of the columns to select. All the model columns by default.
+
+    where : sqlalchemy.sql.expression.ColumnElement, optional
+        A filter criterion such as Model.Year == 2019, whose values are sent as bound parameters.
+
+    chunksize : int, optional
+        If given, stream the rows through a server-side cursor and return an iterator
+        of DataFrames with at most chunksize rows each instead of a single DataFrame.
+
+    dtype_backend : str, optional
+        'pyarrow' to return Arrow-backed columns. NumPy dtypes are used by default.
     
     Returns
     -------
-    df : pandas.DataFrame
+    df : pandas.DataFrame or iterator of pandas.DataFrame
         A pandas DataFrame object representing the queried data.
     """
 
-    query = session.query(db_model).statement
-    df = pd.read_sql(query, connection)
+    if columns is None:
+        columns = [column.name for column in db_model.__table__.columns]
+
+    query = select(*(getattr(db_model, col) for col in columns))
+    if where is not None:
+        query = query.where(where)
+
+    if chunksize is not None:
+        return stream_query(query, connection, chunksize, dtype_backend)
+
+    options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+    df = pd.read_sql(query, connection, **options)
 
     log.info("Data queried successfully.")
     return df
 
+def stream_query(query, connection, chunksize : int, dtype_backend : str = None):
+    """
+    Read the result of a query in chunks using a server-side cursor
+
+    Parameters
+    ----------
+    query : sqlalchemy.sql.expression.Select
+        A SQLAlchemy Select object representing the query to run.
+
+    connection : sqlalchemy.engine.base.Engine or sqlalchemy.engine.base.Connection
+        A SQLAlchemy Engine object representing the established connection, or an
+        open Connection to read the rows with.
+
+    chunksize : int
+        The number of rows fetched from the server and returned per DataFrame.
+
+    dtype_backend : str, optional
+        'pyarrow' to return Arrow-backed columns. NumPy dtypes are used by default.
+
+    Yields
+    ------
+    df : pandas.DataFrame
+        A pandas DataFrame object with the next chunk of queried data.
+    """
+    options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+    query = query.execution_options(stream_results=True, yield_per=chunksize)
+
+    if isinstance(connection, Engine):
+        with connection.connect() as conn:
+            yield from pd.read_sql(query, conn, chunksize=chunksize, **options)
+    else:
+        yield from pd.read_sql(query, connection, chunksize=chunksize, **options)
+
+    log.info("Data queried successfully.")
+
 """
  Make sure to replace the placeholder credentials with your actual database credentials.
 """
\ No newline at end of file
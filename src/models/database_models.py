@@ -10,22 +10,22 @@ class Model(BASE):
     __tablename__ = 'ml_model'
 
     id = Column(Integer, primary_key=True)
-    Social_Support = Column(Float, nullable=False)
+    Social_Support = Column(Float(precision=24), nullable=False)
     Year = Column(Integer, nullable=False)
-    Trust = Column(Float, nullable=False)
-    Generosity = Column(Float, nullable=False)
-    Health = Column(Float, nullable=False)
-    Economy = Column(Float, nullable=False)
-    Freedom = Column(Float, nullable=False)
-    Continent_Africa = Column(Integer, nullable=False)
-    Continent_Asia = Column(Integer, nullable=False)
-    Continent_Europe = Column(Integer, nullable=False)
-    Continent_North_America = Column(Integer, nullable=False)
-    Continent_Oceania = Column(Integer, nullable=False)
-    Continent_South_America = Column(Integer, nullable=False)
-    Economy_Health = Column(Float, nullable=False)
-    Trust_Freedom = Column(Float, nullable=False)
-    Economy_Trust = Column(Float, nullable=False)
-    Trust_Health = Column(Float, nullable=False)
-    Happiness_Score = Column(Float, nullable=False)
-    Predicted_Happiness_Score = Column(Float, nullable=False)
\ No newline at end of file
+    Trust = Column(Float(precision=24), nullable=False)
+    Generosity = Column(Float(precision=24), nullable=False)
+    Health = Column(Float(precision=24), nullable=False)
+    Economy = Column(Float(precision=24), nullable=False)
+    Freedom = Column(Float(precision=24), nullable=False)
+    Continent_Africa = Column(Boolean, nullable=False)
+    Continent_Asia = Column(Boolean, nullable=False)
+    Continent_Europe = Column(Boolean, nullable=False)
+    Continent_North_America = Column(Boolean, nullable=False)
+    Continent_Oceania = Column(Boolean, nullable=False)
+    Continent_South_America = Column(Boolean, nullable=False)
+    Economy_Health = Column(Float(precision=24), nullable=False)
+    Trust_Freedom = Column(Float(precision=24), nullable=False)
+    Economy_Trust = Column(Float(precision=24), nullable=False)
+    Trust_Health = Column(Float(precision=24), nullable=False)
+    Happiness_Score = Column(Float(precision=24), nullable=False)
+    Predicted_Happiness_Score = Column(Float(precision=24), nullable=False)
\ No newline at end of file
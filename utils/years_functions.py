@@ -3,35 +3,69 @@ This module contains functions to work years datasets
 """
 
 import os
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+import numpy as np
 import pandas as pd
 import logging as log
 
 log.basicConfig(level=log.INFO)
 
+CONTINENTS = ['Africa', 'Asia', 'Europe', 'North America', 'Oceania', 'South America']
+CONTINENT_DTYPE = pd.CategoricalDtype(categories=CONTINENTS)
+CATEGORICAL_COLUMNS = ['Country', 'Continent']
+CONTINENT_COLUMNS = [f"Continent_{continent.replace(' ', '_')}" for continent in CONTINENTS]
 
-def load_datasets(path : str) -> dict:
+# One row per continent code plus a trailing row of zeros picked by the -1 code of unmapped countries
+_CONTINENT_ONE_HOT = np.eye(len(CONTINENTS) + 1, len(CONTINENTS), dtype=np.int8)
+
+
+def read_dataset(full_path : str, dtype_backend : str = None) -> pd.DataFrame:
+    """
+    Read a single CSV dataset, using the multithreaded pyarrow parser
+
+    Parameters:
+    -----------
+    full_path (str): The path to the CSV file
+    dtype_backend (str, optional): 'pyarrow' to keep the columns Arrow-backed, so they can be
+        concatenated without copying buffers. NumPy dtypes are used by default.
+
+    Returns:
+    --------
+    df (pd.DataFrame): The loaded dataset
+    """
+
+    options = {} if dtype_backend is None else {'dtype_backend': dtype_backend}
+    return pd.read_csv(full_path, engine='pyarrow', **options)
+
+
+def load_datasets(path : str, dtype_backend : str = None) -> dict:
     """
     Load all datasets from the data folder
 
+    The files are parsed concurrently in a thread pool, the CSV parsers release the GIL.
+
     Parameters:
     -----------
-    None
+    path (str): The folder containing the yearly CSV files
+    dtype_backend (str, optional): The dtype backend passed on to read_dataset
 
     Returns:
     --------
     datasets (dict): A dictionary with the year as key and the dataset as value
     """
 
-    datasets = {}
+    files = {}
     
-    for filename in os.listdir(path):
+    for filename in sorted(os.listdir(path)):
         if filename.endswith('.csv'):  
 
             year = int(filename.split('.')[0][-4:])
-            
-            full_path = os.path.join(path, filename)
-            df = pd.read_csv(full_path)
-            datasets[year] = df
+            files[year] = os.path.join(path, filename)
+
+    with ThreadPoolExecutor() as executor:
+        dfs = executor.map(read_dataset, files.values(), [dtype_backend] * len(files))
+        datasets = dict(zip(files, dfs))
 
     log.info(f"Loaded {len(datasets)} datasets")
     return datasets
@@ -96,7 +130,7 @@ def compare_rows_columns(df_dict) -> None:
         print()
 
 
-def compare_column_names(df_dict) -> None:
+def compare_column_names(df_dict) -> pd.DataFrame:
     """
     Compare the column names of DataFrames in the given dictionary.
 
@@ -106,27 +140,48 @@ def compare_column_names(df_dict) -> None:
 
     Returns:
     --------
-    None (prints the comparison)
+    pd.DataFrame: A presence table with the sorted column names as index, the years as
+        columns and True where the column exists in that year's DataFrame.
     """
-    all_columns = set()
-    for df in df_dict.values():
-        all_columns.update(df.columns)
-
-    max_column_length = max(len(col) for col in all_columns)
-    
-    print(f"{'Column Names':<{max_column_length}}", end="\t")
-    for year in df_dict.keys():
-        print(year, end="\t")
-    print()
-
-    for col in sorted(all_columns):
-        print(f"{col:<{max_column_length}}", end="\t")
-        for year in df_dict.keys():
-            if col in df_dict[year].columns:
-                print("X", end="\t")
-            else:
-                print("", end="\t")
-        print()
+    presence = pd.DataFrame({year: pd.Series(1, index=df.columns) for year, df in df_dict.items()})
+    presence = presence.notna().sort_index()
+    presence.index.name = 'Column Names'
+
+    return presence
+
+
+_COLUMN_MAPPING = MappingProxyType({
+    'Country': 'Country',
+    'Country or region': 'Country',
+    'Dystopia Residual': 'Dystopia_Residual',
+    'Dystopia.Residual': 'Dystopia_Residual',
+    'Economy (GDP per Capita)': 'Economy',
+    'Economy..GDP.per.Capita.': 'Economy',
+    'Family': 'Social_Support',
+    'Freedom': 'Freedom',
+    'Freedom to make life choices': 'Freedom',
+    'GDP per capita': 'Economy',
+    'Generosity': 'Generosity',
+    'Happiness Rank': 'Happiness_Rank',
+    'Happiness Score': 'Happiness_Score',
+    'Happiness.Rank': 'Happiness_Rank',
+    'Happiness.Score': 'Happiness_Score',
+    'Health (Life Expectancy)': 'Health',
+    'Health..Life.Expectancy.': 'Health',
+    'Healthy life expectancy': 'Health',
+    'Lower Confidence Interval': 'Lower_Confidence_Interval',
+    'Overall rank': 'Happiness_Rank',
+    'Perceptions of corruption': 'Trust',
+    'Trust (Government Corruption)': 'Trust',
+    'Trust..Government.Corruption.': 'Trust',
+    'Region': 'Region',
+    'Score': 'Happiness_Score',
+    'Social support': 'Social_Support',
+    'Standard Error': 'Standard_Error',
+    'Upper Confidence Interval': 'Upper_Confidence_Interval',
+    'Whisker.high': 'Whisker_High',
+    'Whisker.low': 'Whisker_Low'
+})
 
 
 def normalize_column_names(df_dict) -> dict:
@@ -141,42 +196,10 @@ def normalize_column_names(df_dict) -> dict:
     --------
     dict: A dictionary with the year as key and the DataFrame with normalized column names as value.
     """
-    column_mapping = {
-        'Country': 'Country',
-        'Country or region': 'Country',
-        'Dystopia Residual': 'Dystopia_Residual',
-        'Dystopia.Residual': 'Dystopia_Residual',
-        'Economy (GDP per Capita)': 'Economy',
-        'Economy..GDP.per.Capita.': 'Economy',
-        'Family': 'Social_Support',
-        'Freedom': 'Freedom',
-        'Freedom to make life choices': 'Freedom',
-        'GDP per capita': 'Economy',
-        'Generosity': 'Generosity',
-        'Happiness Rank': 'Happiness_Rank',
-        'Happiness Score': 'Happiness_Score',
-        'Happiness.Rank': 'Happiness_Rank',
-        'Happiness.Score': 'Happiness_Score',
-        'Health (Life Expectancy)': 'Health',
-        'Health..Life.Expectancy.': 'Health',
-        'Healthy life expectancy': 'Health',
-        'Lower Confidence Interval': 'Lower_Confidence_Interval',
-        'Overall rank': 'Happiness_Rank',
-        'Perceptions of corruption': 'Trust',
-        'Trust (Government Corruption)': 'Trust',
-        'Trust..Government.Corruption.': 'Trust',
-        'Region': 'Region',
-        'Score': 'Happiness_Score',
-        'Social support': 'Social_Support',
-        'Standard Error': 'Standard_Error',
-        'Upper Confidence Interval': 'Upper_Confidence_Interval',
-        'Whisker.high': 'Whisker_High',
-        'Whisker.low': 'Whisker_Low'
-    }
 
     normalized_datasets = {}
     for year, df in df_dict.items():
-        df = df.rename(columns=column_mapping)
+        df = df.rename(columns=_COLUMN_MAPPING)
         normalized_datasets[year] = df
 
     log.info("Column names normalized")
@@ -211,18 +234,248 @@ def concatenate_common_columns(df_dict) -> pd.DataFrame:
 
     Returns:
     --------
-    pandas.DataFrame: Concatenated DataFrame with only common columns.
+    pandas.DataFrame: Concatenated DataFrame with only common columns, 'Country' as a category.
     """
-    common_columns = list(set.intersection(*[set(df.columns) for df in df_dict.values()]))
+    common_columns = list(set.intersection(*(set(df.columns) for df in df_dict.values())))
 
-    dfs_common_columns = {year: df[common_columns] for year, df in df_dict.items()}
+    concatenated_df = pd.concat((df.loc[:, common_columns] for df in df_dict.values()), ignore_index=True, copy=False)
 
-    concatenated_df = pd.concat(dfs_common_columns.values(), ignore_index=True)
+    return optimize_dtypes(concatenated_df)
 
-    return concatenated_df
 
 
-def map_country_to_continent(df : pd.DataFrame) -> pd.DataFrame:
+def load_and_merge(path : str, dtype_backend : str = None) -> pd.DataFrame:
+    """
+    Load all datasets from the data folder and concatenate them in a single pass.
+
+    Equivalent to load_datasets, normalize_column_names, add_year_column and
+    concatenate_common_columns chained, without building the intermediate dictionaries.
+    Columns keep the order of the first file.
+
+    Parameters:
+    -----------
+    path (str): The folder containing the yearly CSV files
+    dtype_backend (str, optional): The dtype backend passed on to read_dataset
+
+    Returns:
+    --------
+    pandas.DataFrame: Concatenated DataFrame with the normalized columns common to every year.
+    """
+
+    frames = []
+    common_columns = None
+
+    for year, df in load_datasets(path, dtype_backend).items():
+        df.rename(columns=_COLUMN_MAPPING, inplace=True)
+        df['Year'] = year
+
+        if common_columns is None:
+            common_columns = list(df.columns)
+        else:
+            common_columns = [col for col in common_columns if col in df.columns]
+
+        frames.append(df)
+
+    concatenated_df = pd.concat((df[common_columns] for df in frames), ignore_index=True, copy=False)
+
+    log.info(f"Merged {len(frames)} datasets")
+    return optimize_dtypes(concatenated_df)
+
+
+def optimize_dtypes(df : pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the repeated string columns 'Country' and 'Continent' to the category dtype.
+
+    Parameters:
+    -----------
+    df (pd.DataFrame): The DataFrame to convert, modified in place.
+
+    Returns:
+    --------
+    pd.DataFrame: The DataFrame with categorical 'Country' and 'Continent' columns.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+_COUNTRY_TO_CONTINENT = MappingProxyType({
+    'Switzerland': 'Europe',
+    'Iceland': 'Europe',
+    'Denmark': 'Europe',
+    'Norway': 'Europe',
+    'Canada': 'North America',
+    'Finland': 'Europe',
+    'Netherlands': 'Europe',
+    'Sweden': 'Europe',
+    'New Zealand': 'Oceania',
+    'Australia': 'Oceania',
+    'Israel': 'Asia',
+    'Costa Rica': 'North America',
+    'Austria': 'Europe',
+    'Mexico': 'North America',
+    'United States': 'North America',
+    'Brazil': 'South America',
+    'Luxembourg': 'Europe',
+    'Ireland': 'Europe',
+    'Belgium': 'Europe',
+    'United Arab Emirates': 'Asia',
+    'United Kingdom': 'Europe',
+    'Oman': 'Asia',
+    'Venezuela': 'South America',
+    'Singapore': 'Asia',
+    'Panama': 'North America',
+    'Germany': 'Europe',
+    'Chile': 'South America',
+    'Qatar': 'Asia',
+    'France': 'Europe',
+    'Argentina': 'South America',
+    'Czech Republic': 'Europe',
+    'Uruguay': 'South America',
+    'Colombia': 'South America',
+    'Thailand': 'Asia',
+    'Saudi Arabia': 'Asia',
+    'Spain': 'Europe',
+    'Malta': 'Europe',
+    'Taiwan': 'Asia',
+    'Kuwait': 'Asia',
+    'Suriname': 'South America',
+    'Trinidad and Tobago': 'North America',
+    'El Salvador': 'North America',
+    'Guatemala': 'North America',
+    'Uzbekistan': 'Asia',
+    'Slovakia': 'Europe',
+    'Japan': 'Asia',
+    'South Korea': 'Asia',
+    'Ecuador': 'South America',
+    'Bahrain': 'Asia',
+    'Italy': 'Europe',
+    'Bolivia': 'South America',
+    'Moldova': 'Europe',
+    'Paraguay': 'South America',
+    'Kazakhstan': 'Asia',
+    'Slovenia': 'Europe',
+    'Lithuania': 'Europe',
+    'Nicaragua': 'North America',
+    'Peru': 'South America',
+    'Belarus': 'Europe',
+    'Poland': 'Europe',
+    'Malaysia': 'Asia',
+    'Croatia': 'Europe',
+    'Libya': 'Africa',
+    'Russia': 'Europe',
+    'Jamaica': 'North America',
+    'North Cyprus': 'Europe',
+    'Cyprus': 'Europe',
+    'Algeria': 'Africa',
+    'Kosovo': 'Europe',
+    'Turkmenistan': 'Asia',
+    'Mauritius': 'Africa',
+    'Hong Kong': 'Asia',
+    'Estonia': 'Europe',
+    'Indonesia': 'Asia',
+    'Vietnam': 'Asia',
+    'Turkey': 'Asia',
+    'Kyrgyzstan': 'Asia',
+    'Nigeria': 'Africa',
+    'Bhutan': 'Asia',
+    'Azerbaijan': 'Asia',
+    'Pakistan': 'Asia',
+    'Jordan': 'Asia',
+    'Montenegro': 'Europe',
+    'China': 'Asia',
+    'Zambia': 'Africa',
+    'Romania': 'Europe',
+    'Serbia': 'Europe',
+    'Portugal': 'Europe',
+    'Latvia': 'Europe',
+    'Philippines': 'Asia',
+    'Somaliland region': 'Africa',
+    'Morocco': 'Africa',
+    'Macedonia': 'Europe',
+    'Mozambique': 'Africa',
+    'Albania': 'Europe',
+    'Bosnia and Herzegovina': 'Europe',
+    'Lesotho': 'Africa',
+    'Dominican Republic': 'North America',
+    'Laos': 'Asia',
+    'Mongolia': 'Asia',
+    'Swaziland': 'Africa',
+    'Greece': 'Europe',
+    'Lebanon': 'Asia',
+    'Hungary': 'Europe',
+    'Honduras': 'North America',
+    'Tajikistan': 'Asia',
+    'Tunisia': 'Africa',
+    'Palestinian Territories': 'Asia',
+    'Bangladesh': 'Asia',
+    'Iran': 'Asia',
+    'Ukraine': 'Europe',
+    'Iraq': 'Asia',
+    'South Africa': 'Africa',
+    'Ghana': 'Africa',
+    'Zimbabwe': 'Africa',
+    'Liberia': 'Africa',
+    'India': 'Asia',
+    'Sudan': 'Africa',
+    'Haiti': 'North America',
+    'Congo (Kinshasa)': 'Africa',
+    'Nepal': 'Asia',
+    'Ethiopia': 'Africa',
+    'Sierra Leone': 'Africa',
+    'Mauritania': 'Africa',
+    'Kenya': 'Africa',
+    'Djibouti': 'Africa',
+    'Armenia': 'Asia',
+    'Botswana': 'Africa',
+    'Myanmar': 'Asia',
+    'Georgia': 'Asia',
+    'Malawi': 'Africa',
+    'Sri Lanka': 'Asia',
+    'Cameroon': 'Africa',
+    'Bulgaria': 'Europe',
+    'Egypt': 'Africa',
+    'Yemen': 'Asia',
+    'Angola': 'Africa',
+    'Mali': 'Africa',
+    'Congo (Brazzaville)': 'Africa',
+    'Comoros': 'Africa',
+    'Uganda': 'Africa',
+    'Senegal': 'Africa',
+    'Gabon': 'Africa',
+    'Niger': 'Africa',
+    'Cambodia': 'Asia',
+    'Tanzania': 'Africa',
+    'Madagascar': 'Africa',
+    'Central African Republic': 'Africa',
+    'Chad': 'Africa',
+    'Guinea': 'Africa',
+    'Ivory Coast': 'Africa',
+    'Burkina Faso': 'Africa',
+    'Afghanistan': 'Asia',
+    'Rwanda': 'Africa',
+    'Benin': 'Africa',
+    'Syria': 'Asia',
+    'Burundi': 'Africa',
+    'Togo': 'Africa',
+    'Puerto Rico': 'North America',
+    'Belize': 'North America',
+    'Somalia': 'Africa',
+    'Somaliland Region': 'Africa',
+    'Namibia': 'Africa',
+    'South Sudan': 'Africa',
+    'Taiwan Province of China': 'Asia',
+    'Hong Kong S.A.R., China': 'Asia',
+    'Trinidad & Tobago': 'North America',
+    'Northern Cyprus': 'Europe',
+    'North Macedonia': 'Europe',
+    'Gambia': 'Africa'
+})
+
+
+def map_country_to_continent(df : pd.DataFrame, one_hot : bool = False) -> pd.DataFrame:
     """
     Map countries to continents.
 
@@ -231,186 +484,23 @@ def map_country_to_continent(df : pd.DataFrame) -> pd.DataFrame:
     df : pd.DataFrame
         The DataFrame to map countries to continents.
 
+    one_hot : bool, default False
+        Add the int8 one-hot columns Continent_Africa, ..., Continent_South_America instead of
+        the 'Continent' column, built in a single vectorized step rather than with pd.get_dummies.
+
     Returns:
     --------
     pd.DataFrame
-        The DataFrame with the 'Continent' column added.
+        The DataFrame with the 'Continent' column, or its one-hot columns if one_hot is True, added.
     """
+    continents = df['Country'].map(_COUNTRY_TO_CONTINENT).astype(CONTINENT_DTYPE)
 
-    country_to_continent = {
-        'Switzerland': 'Europe',
-        'Iceland': 'Europe',
-        'Denmark': 'Europe',
-        'Norway': 'Europe',
-        'Canada': 'North America',
-        'Finland': 'Europe',
-        'Netherlands': 'Europe',
-        'Sweden': 'Europe',
-        'New Zealand': 'Oceania',
-        'Australia': 'Oceania',
-        'Israel': 'Asia',
-        'Costa Rica': 'North America',
-        'Austria': 'Europe',
-        'Mexico': 'North America',
-        'United States': 'North America',
-        'Brazil': 'South America',
-        'Luxembourg': 'Europe',
-        'Ireland': 'Europe',
-        'Belgium': 'Europe',
-        'United Arab Emirates': 'Asia',
-        'United Kingdom': 'Europe',
-        'Oman': 'Asia',
-        'Venezuela': 'South America',
-        'Singapore': 'Asia',
-        'Panama': 'North America',
-        'Germany': 'Europe',
-        'Chile': 'South America',
-        'Qatar': 'Asia',
-        'France': 'Europe',
-        'Argentina': 'South America',
-        'Czech Republic': 'Europe',
-        'Uruguay': 'South America',
-        'Colombia': 'South America',
-        'Thailand': 'Asia',
-        'Saudi Arabia': 'Asia',
-        'Spain': 'Europe',
-        'Malta': 'Europe',
-        'Taiwan': 'Asia',
-        'Kuwait': 'Asia',
-        'Suriname': 'South America',
-        'Trinidad and Tobago': 'North America',
-        'El Salvador': 'North America',
-        'Guatemala': 'North America',
-        'Uzbekistan': 'Asia',
-        'Slovakia': 'Europe',
-        'Japan': 'Asia',
-        'South Korea': 'Asia',
-        'Ecuador': 'South America',
-        'Bahrain': 'Asia',
-        'Italy': 'Europe',
-        'Bolivia': 'South America',
-        'Moldova': 'Europe',
-        'Paraguay': 'South America',
-        'Kazakhstan': 'Asia',
-        'Slovenia': 'Europe',
-        'Lithuania': 'Europe',
-        'Nicaragua': 'North America',
-        'Peru': 'South America',
-        'Belarus': 'Europe',
-        'Poland': 'Europe',
-        'Malaysia': 'Asia',
-        'Croatia': 'Europe',
-        'Libya': 'Africa',
-        'Russia': 'Europe',
-        'Jamaica': 'North America',
-        'North Cyprus': 'Europe',
-        'Cyprus': 'Europe',
-        'Algeria': 'Africa',
-        'Kosovo': 'Europe',
-        'Turkmenistan': 'Asia',
-        'Mauritius': 'Africa',
-        'Hong Kong': 'Asia',
-        'Estonia': 'Europe',
-        'Indonesia': 'Asia',
-        'Vietnam': 'Asia',
-        'Turkey': 'Asia',
-        'Kyrgyzstan': 'Asia',
-        'Nigeria': 'Africa',
-        'Bhutan': 'Asia',
-        'Azerbaijan': 'Asia',
-        'Pakistan': 'Asia',
-        'Jordan': 'Asia',
-        'Montenegro': 'Europe',
-        'China': 'Asia',
-        'Zambia': 'Africa',
-        'Romania': 'Europe',
-        'Serbia': 'Europe',
-        'Portugal': 'Europe',
-        'Latvia': 'Europe',
-        'Philippines': 'Asia',
-        'Somaliland region': 'Africa',
-        'Morocco': 'Africa',
-        'Macedonia': 'Europe',
-        'Mozambique': 'Africa',
-        'Albania': 'Europe',
-        'Bosnia and Herzegovina': 'Europe',
-        'Lesotho': 'Africa',
-        'Dominican Republic': 'North America',
-        'Laos': 'Asia',
-        'Mongolia': 'Asia',
-        'Swaziland': 'Africa',
-        'Greece': 'Europe',
-        'Lebanon': 'Asia',
-        'Hungary': 'Europe',
-        'Honduras': 'North America',
-        'Tajikistan': 'Asia',
-        'Tunisia': 'Africa',
-        'Palestinian Territories': 'Asia',
-        'Bangladesh': 'Asia',
-        'Iran': 'Asia',
-        'Ukraine': 'Europe',
-        'Iraq': 'Asia',
-        'South Africa': 'Africa',
-        'Ghana': 'Africa',
-        'Zimbabwe': 'Africa',
-        'Liberia': 'Africa',
-        'India': 'Asia',
-        'Sudan': 'Africa',
-        'Haiti': 'North America',
-        'Congo (Kinshasa)': 'Africa',
-        'Nepal': 'Asia',
-        'Ethiopia': 'Africa',
-        'Sierra Leone': 'Africa',
-        'Mauritania': 'Africa',
-        'Kenya': 'Africa',
-        'Djibouti': 'Africa',
-        'Armenia': 'Asia',
-        'Botswana': 'Africa',
-        'Myanmar': 'Asia',
-        'Georgia': 'Asia',
-        'Malawi': 'Africa',
-        'Sri Lanka': 'Asia',
-        'Cameroon': 'Africa',
-        'Bulgaria': 'Europe',
-        'Egypt': 'Africa',
-        'Yemen': 'Asia',
-        'Angola': 'Africa',
-        'Mali': 'Africa',
-        'Congo (Brazzaville)': 'Africa',
-        'Comoros': 'Africa',
-        'Uganda': 'Africa',
-        'Senegal': 'Africa',
-        'Gabon': 'Africa',
-        'Niger': 'Africa',
-        'Cambodia': 'Asia',
-        'Tanzania': 'Africa',
-        'Madagascar': 'Africa',
-        'Central African Republic': 'Africa',
-        'Chad': 'Africa',
-        'Guinea': 'Africa',
-        'Ivory Coast': 'Africa',
-        'Burkina Faso': 'Africa',
-        'Afghanistan': 'Asia',
-        'Rwanda': 'Africa',
-        'Benin': 'Africa',
-        'Syria': 'Asia',
-        'Burundi': 'Africa',
-        'Togo': 'Africa',
-        'Puerto Rico': 'North America',
-        'Belize': 'North America',
-        'Somalia': 'Africa',
-        'Somaliland Region': 'Africa',
-        'Namibia': 'Africa',
-        'South Sudan': 'Africa',
-        'Taiwan Province of China': 'Asia',
-        'Hong Kong S.A.R., China': 'Asia',
-        'Trinidad & Tobago': 'North America',
-        'Northern Cyprus': 'Europe',
-        'North Macedonia': 'Europe',
-        'Gambia': 'Africa'
-    }
-    
-    df['Continent'] = df['Country'].map(country_to_continent)
+    if one_hot:
+        codes = continents.cat.codes.to_numpy()
+        df[CONTINENT_COLUMNS] = _CONTINENT_ONE_HOT[codes]
+        return df
+
+    df['Continent'] = continents
     return df
 
 